@@ -35,5 +35,17 @@ def create_app():
     from app.routes.predict import prediction
     app.register_blueprint(prediction)
 
+    from app.routes.sync import sync as sync_routes
+    app.register_blueprint(sync_routes)
+
+    from app.routes.metrics import metrics as metrics_routes
+    app.register_blueprint(metrics_routes)
+
+    #batch jobs (flask mood-trends run / bench, flask sync backfill)
+    from app.jobs.mood_trends import mood_trends_cli
+    app.cli.add_command(mood_trends_cli)
+    from app.jobs.sync_backfill import sync_cli
+    app.cli.add_command(sync_cli)
+
     
     return app
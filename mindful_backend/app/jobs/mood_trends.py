@@ -0,0 +1,331 @@
+"""
+Batch job computing per-user mood trends over 7/30/90-day windows.
+
+Entries are streamed from 'mood_entries' in (user_id, created_at) order, grouped
+into blocks of whole users, encoded into NumPy arrays and processed for every
+user in the block at once. Results are upserted into 'mood_trends'.
+
+Run with `flask mood-trends run` (add --full to recompute every user) and
+measure throughput with `flask mood-trends bench`.
+"""
+from flask.cli import AppGroup
+from pymongo import UpdateOne
+from app import mongo
+from app.utils.sync import settled_before
+import numpy as np
+import click
+import datetime
+import time
+
+# Score used for averages and volatility; unknown moods score 0
+MOOD_SCORES = {
+    'Happy': 2,
+    'Excited': 2,
+    'Neutral': 0,
+    'Anxious': -1,
+    'Angry': -1,
+    'Sad': -2,
+}
+MOOD_LABELS = list(MOOD_SCORES) + ['Other']
+SCORE_TABLE = np.array(list(MOOD_SCORES.values()) + [0], dtype=np.float32)
+
+WINDOWS = (7, 30, 90)
+# Shifts compare each window with the one before it, so twice the longest window is needed
+HISTORY_DAYS = 2 * max(WINDOWS)
+
+BATCH_SIZE = 50000
+# Users per $in query when recomputing only the users that changed
+USER_CHUNK_SIZE = 1000
+
+JOB_ID = 'mood_trends'
+
+def encode_moods(moods):
+    """
+    Maps mood names to indexes into MOOD_LABELS as a compact uint8 array.
+    Values that are not strings count as 'Other'.
+    """
+    moods = [m if isinstance(m, str) else '' for m in moods]
+    uniques, inverse = np.unique(np.array(moods, dtype=str), return_inverse=True)
+    lookup = np.array(
+        [MOOD_LABELS.index(m) if m in MOOD_SCORES else len(MOOD_LABELS) - 1 for m in uniques],
+        dtype=np.uint8
+    )
+    return lookup[inverse]
+
+def _dominant(user_idx, codes, n_users, n_codes):
+    """
+    Most frequent code per user, or -1 for users without entries.
+    """
+    hist = np.bincount(user_idx * n_codes + codes, minlength=n_users * n_codes).reshape(n_users, n_codes)
+    dominant = hist.argmax(axis=1)
+    dominant[hist.sum(axis=1) == 0] = -1
+    return dominant
+
+def _window_stats(user_idx, codes, scores, mask, n_users):
+    users = user_idx[mask]
+    count = np.bincount(users, minlength=n_users)
+    total = np.bincount(users, weights=scores[mask], minlength=n_users)
+    total_sq = np.bincount(users, weights=scores[mask] ** 2, minlength=n_users)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        volatility = np.sqrt(np.maximum(total_sq / count - mean ** 2, 0))
+    dominant = _dominant(users, codes[mask].astype(np.int64), n_users, len(MOOD_LABELS))
+    return count, mean, volatility, dominant
+
+def _leading_run(presence):
+    """
+    Number of consecutive True values at the start of each row.
+    """
+    return np.where(presence.all(axis=1), presence.shape[1], presence.argmin(axis=1))
+
+def compute_trends(user_idx, age_days, mood_codes, n_users):
+    """
+    Computes trend signals for every user at once.
+
+    user_idx   -- int array, the user each entry belongs to (0..n_users-1)
+    age_days   -- int array, days between the entry and today (0 = today)
+    mood_codes -- uint8 array from encode_moods
+
+    Returns a dict of arrays with one row per user: 'streak' plus, for each window
+    length W, 'count_W', 'avg_W', 'volatility_W', 'trend_W' (change in average since
+    the previous W days), 'dominant_W' (index into MOOD_LABELS, -1 if none) and
+    'shift_W' (dominant mood differs from the previous W days).
+    """
+    user_idx = np.asarray(user_idx, dtype=np.int64)
+    age_days = np.clip(np.asarray(age_days, dtype=np.int64), 0, None) # Future client timestamps count as today
+    in_range = age_days < HISTORY_DAYS
+    user_idx, age_days, mood_codes = user_idx[in_range], age_days[in_range], np.asarray(mood_codes)[in_range]
+    scores = SCORE_TABLE[mood_codes]
+
+    presence = np.zeros((n_users, HISTORY_DAYS), dtype=bool)
+    presence[user_idx, age_days] = True
+    # A streak still counts if today's mood has not been logged yet
+    trends = {'streak': np.where(presence[:, 0], _leading_run(presence), _leading_run(presence[:, 1:]))}
+
+    for window in WINDOWS:
+        current = age_days < window
+        previous = ~current & (age_days < 2 * window)
+        count, mean, volatility, dominant = _window_stats(user_idx, mood_codes, scores, current, n_users)
+        _, prev_mean, _, prev_dominant = _window_stats(user_idx, mood_codes, scores, previous, n_users)
+        trends[f'count_{window}'] = count
+        trends[f'avg_{window}'] = mean
+        trends[f'volatility_{window}'] = volatility
+        trends[f'trend_{window}'] = mean - prev_mean
+        trends[f'dominant_{window}'] = dominant
+        trends[f'shift_{window}'] = (dominant >= 0) & (prev_dominant >= 0) & (dominant != prev_dominant)
+    return trends
+
+def _age_in_days(dates, today):
+    days = np.array(dates, dtype='datetime64[us]').astype('datetime64[D]')
+    return (today - days).astype(np.int64)
+
+def _iter_user_blocks(cursor, block_size):
+    """
+    Groups a cursor sorted by user_id into column lists holding at least
+    'block_size' entries, never splitting one user's entries across blocks.
+    """
+    users, moods, dates = [], [], []
+    for doc in cursor:
+        if len(users) >= block_size and doc['user_id'] != users[-1]:
+            yield users, moods, dates
+            users, moods, dates = [], [], []
+        users.append(doc['user_id'])
+        mood = doc.get('mood')
+        # Older entries were stored without type checks; anything but a string counts as 'Other'
+        moods.append(mood if isinstance(mood, str) else '')
+        dates.append(doc['created_at'])
+    if users:
+        yield users, moods, dates
+
+def _prediction_labels(user_ids, start, today):
+    """
+    Dominant stored prediction label per user and window for the given users.
+    user_ids must be sorted. Returns {window: list of labels or None}.
+    """
+    cursor = mongo.db.predictions.find(
+        {'user_id': {'$in': user_ids.tolist()}, 'timestamp': {'$gte': start}},
+        {'user_id': 1, 'prediction': 1, 'timestamp': 1, '_id': 0}
+    )
+    rows = [(p['user_id'], str(p['prediction']), p['timestamp']) for p in cursor]
+    if not rows:
+        return {window: [None] * len(user_ids) for window in WINDOWS}
+
+    pred_users, labels, dates = zip(*rows)
+    user_idx = np.searchsorted(user_ids, np.array(pred_users, dtype=object).astype(str))
+    uniques, codes = np.unique(np.array(labels), return_inverse=True)
+    age_days = np.clip(_age_in_days(dates, today), 0, None)
+
+    results = {}
+    for window in WINDOWS:
+        mask = age_days < window
+        dominant = _dominant(user_idx[mask], codes[mask], len(user_ids), len(uniques))
+        results[window] = [uniques[d].item() if d >= 0 else None for d in dominant]
+    return results
+
+def _trend_updates(user_ids, trends, as_of, predictions=None):
+    """
+    Builds one upsert per user from the arrays returned by compute_trends.
+    """
+    columns = {name: values.tolist() for name, values in trends.items()}
+    updated_at = datetime.datetime.utcnow()
+    updates = []
+    for i, user_id in enumerate(user_ids):
+        windows = {}
+        for window in WINDOWS:
+            count = columns[f'count_{window}'][i]
+            dominant = columns[f'dominant_{window}'][i]
+            windows[f'{window}d'] = {
+                'entries': count,
+                'average': columns[f'avg_{window}'][i] if count else None,
+                'volatility': columns[f'volatility_{window}'][i] if count else None,
+                'trend': columns[f'trend_{window}'][i] if not np.isnan(columns[f'trend_{window}'][i]) else None,
+                'dominant_mood': MOOD_LABELS[dominant] if dominant >= 0 else None,
+                'dominant_shift': columns[f'shift_{window}'][i],
+            }
+            if predictions is not None:
+                windows[f'{window}d']['dominant_prediction'] = predictions[window][i]
+        updates.append(UpdateOne(
+            {'_id': user_id},
+            {'$set': {
+                'user_id': user_id,
+                'as_of': as_of,
+                'streak_days': columns['streak'][i],
+                'windows': windows,
+                'updated_at': updated_at,
+            }},
+            upsert=True
+        ))
+    return updates
+
+def _process_cursor(cursor, today, as_of, start, batch_size, with_predictions):
+    """
+    Computes and writes trends for every user in the cursor. Returns (users, entries).
+    """
+    user_total, entry_total = 0, 0
+    for users, moods, dates in _iter_user_blocks(cursor, batch_size):
+        user_ids, user_idx = np.unique(np.array(users, dtype=object).astype(str), return_inverse=True)
+        trends = compute_trends(user_idx, _age_in_days(dates, today), encode_moods(moods), len(user_ids))
+        predictions = _prediction_labels(user_ids, start, today) if with_predictions else None
+        mongo.db.mood_trends.bulk_write(
+            _trend_updates(user_ids.tolist(), trends, as_of, predictions),
+            ordered=False
+        )
+        user_total += len(user_ids)
+        entry_total += len(users)
+    return user_total, entry_total
+
+def _settled_watermark(previous):
+    """
+    Highest mood entry version that is safe to mark as processed. Versions are
+    reserved before the insert commits, so entries stamped within the sync settle
+    window may still have lower versions in flight; the watermark stays below them
+    and they are scanned again on the next run.
+    """
+    settle_time = settled_before()
+    cursor = mongo.db.mood_entries.find(
+        {'version': {'$gt': previous}}, {'version': 1, 'updated_at': 1}
+    ).sort('version', -1)
+    for entry in cursor:
+        if entry.get('updated_at') is None or entry['updated_at'] < settle_time:
+            return entry['version']
+    return previous
+
+def run_mood_trends(full=False, with_predictions=False, batch_size=BATCH_SIZE):
+    """
+    Runs the job. Without 'full', only users with mood entries written since the
+    last run (tracked by the sync 'version' watermark) are recomputed. The first run
+    of each day is always full, because windows move forward even for users who
+    logged nothing new.
+    Returns a summary dict.
+    """
+    now = datetime.datetime.utcnow()
+    today = np.datetime64(now.date(), 'D')
+    as_of = datetime.datetime.combine(now.date(), datetime.time())
+    start = as_of - datetime.timedelta(days=HISTORY_DAYS - 1)
+
+    mongo.db.mood_entries.create_index([('user_id', 1), ('created_at', 1)])
+    # Incremental runs match on version alone, which the (user_id, version) sync index can't serve
+    mongo.db.mood_entries.create_index([('version', 1)])
+    state = mongo.db.job_state.find_one({'_id': JOB_ID}) or {}
+
+    if state.get('as_of') != as_of or 'watermark' not in state:
+        full = True
+
+    # Read before scanning so entries written during the run are picked up next time
+    high_watermark = _settled_watermark(0 if full else state['watermark'])
+
+    projection = {'user_id': 1, 'mood': 1, 'created_at': 1, '_id': 0}
+    sort = [('user_id', 1), ('created_at', 1)]
+    started = time.perf_counter()
+
+    if full:
+        cursor = mongo.db.mood_entries.find(
+            {'created_at': {'$gte': start}}, projection
+        ).sort(sort).batch_size(batch_size)
+        users, entries = _process_cursor(cursor, today, as_of, start, batch_size, with_predictions)
+    else:
+        changed = mongo.db.mood_entries.aggregate([
+            {'$match': {'version': {'$gt': state['watermark']}}},
+            {'$group': {'_id': '$user_id'}},
+            {'$sort': {'_id': 1}},
+        ])
+        changed = [doc['_id'] for doc in changed]
+        users, entries = 0, 0
+        for i in range(0, len(changed), USER_CHUNK_SIZE):
+            cursor = mongo.db.mood_entries.find(
+                {'user_id': {'$in': changed[i:i + USER_CHUNK_SIZE]}, 'created_at': {'$gte': start}},
+                projection
+            ).sort(sort).batch_size(batch_size)
+            chunk_users, chunk_entries = _process_cursor(cursor, today, as_of, start, batch_size, with_predictions)
+            users += chunk_users
+            entries += chunk_entries
+
+    elapsed = time.perf_counter() - started
+    mongo.db.job_state.update_one(
+        {'_id': JOB_ID},
+        {'$set': {'watermark': high_watermark, 'as_of': as_of, 'finished_at': datetime.datetime.utcnow()}},
+        upsert=True
+    )
+    return {'full': full, 'users': users, 'entries': entries, 'seconds': elapsed}
+
+def benchmark(n_users=10000, entries_per_user=100, seed=0):
+    """
+    Times compute_trends on synthetic data, without touching the database.
+    Returns a summary dict with entries processed per second.
+    """
+    rng = np.random.default_rng(seed)
+    n_entries = n_users * entries_per_user
+    user_idx = np.repeat(np.arange(n_users), entries_per_user)
+    age_days = rng.integers(0, HISTORY_DAYS, size=n_entries)
+    mood_codes = rng.integers(0, len(MOOD_LABELS), size=n_entries).astype(np.uint8)
+
+    started = time.perf_counter()
+    compute_trends(user_idx, age_days, mood_codes, n_users)
+    elapsed = time.perf_counter() - started
+    return {
+        'users': n_users,
+        'entries': n_entries,
+        'seconds': elapsed,
+        'entries_per_second': n_entries / elapsed if elapsed else float('inf'),
+    }
+
+mood_trends_cli = AppGroup('mood-trends', help='Per-user mood trend analytics.')
+
+@mood_trends_cli.command('run')
+@click.option('--full', is_flag=True, help='Recompute every user instead of only changed ones.')
+@click.option('--with-predictions', is_flag=True, help='Include dominant stored prediction labels.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True, help='Entries per processing block.')
+def run_command(full, with_predictions, batch_size):
+    summary = run_mood_trends(full=full, with_predictions=with_predictions, batch_size=batch_size)
+    mode = 'full' if summary['full'] else 'incremental'
+    click.echo(f"{mode} run: {summary['users']} users, {summary['entries']} entries in {summary['seconds']:.2f}s")
+
+@mood_trends_cli.command('bench')
+@click.option('--users', default=10000, show_default=True)
+@click.option('--entries-per-user', default=100, show_default=True)
+def bench_command(users, entries_per_user):
+    summary = benchmark(users, entries_per_user)
+    click.echo(
+        f"{summary['entries']} entries for {summary['users']} users in {summary['seconds']:.3f}s "
+        f"({summary['entries_per_second']:,.0f} entries/s)"
+    )
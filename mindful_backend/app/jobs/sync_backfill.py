@@ -0,0 +1,44 @@
+"""
+One-off backfill giving documents written before version stamps existed a
+'version', so /api/sync returns them on a full sync.
+
+Run with `flask sync backfill` once after deploying the change feed. It is safe
+to re-run: only documents without a 'version' are touched.
+"""
+from flask.cli import AppGroup
+from pymongo import UpdateOne
+from app import mongo
+from app.utils.sync import SYNCED_COLLECTIONS, next_versions, version_stamp
+import click
+
+BATCH_SIZE = 1000
+
+def backfill_versions(batch_size=BATCH_SIZE):
+    """
+    Stamps every unversioned document in the synced collections.
+    Returns {sync name: documents stamped}.
+    """
+    stamped = {}
+    for name, config in SYNCED_COLLECTIONS.items():
+        collection = mongo.db[config['collection']]
+        stamped[name] = 0
+        while True:
+            ids = [doc['_id'] for doc in collection.find({'version': {'$exists': False}}, {'_id': 1}).limit(batch_size)]
+            if not ids:
+                break
+            first_version = next_versions(len(ids))
+            collection.bulk_write([
+                # Skip documents a live write stamped in the meantime
+                UpdateOne({'_id': _id, 'version': {'$exists': False}}, {'$set': version_stamp(first_version + offset)})
+                for offset, _id in enumerate(ids)
+            ], ordered=False)
+            stamped[name] += len(ids)
+    return stamped
+
+sync_cli = AppGroup('sync', help='Change feed maintenance.')
+
+@sync_cli.command('backfill')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True, help='Documents stamped per round trip.')
+def backfill_command(batch_size):
+    for name, count in backfill_versions(batch_size).items():
+        click.echo(f"{name}: {count} documents stamped")
@@ -6,6 +6,7 @@ import datetime
 import jwt
 from app import mongo
 from app.models.user import User
+from app.utils.sync import version_stamp, record_tombstone
 
 exercise_bp = Blueprint('exercises', __name__)
 
@@ -60,7 +61,8 @@ def upload_exercise():
             'difficulty': difficulty,
             'description': description,
             'instructions': instructions.split('\n') if instructions else [],
-            'file_path': ''
+            'file_path': '',
+            **version_stamp()
         }
         
         # Insert into database to get ID
@@ -81,7 +83,7 @@ def upload_exercise():
         # Update database with relative file path
         mongo.db.exercises.update_one(
             {'_id': ObjectId(object_id)},
-            {'$set': {'file_path': filename}}
+            {'$set': {'file_path': filename, **version_stamp()}}
         )
         
         return jsonify({
@@ -93,6 +95,7 @@ def upload_exercise():
     except Exception as e:
         if 'object_id' in locals():
             mongo.db.exercises.delete_one({'_id': ObjectId(object_id)})
+            record_tombstone('exercises', object_id)
         return jsonify({'error': str(e)}), 500
 
 @exercise_bp.route('/exercises/<exercise_id>', methods=['DELETE'])
@@ -111,6 +114,7 @@ def delete_exercise(exercise_id):
                 os.remove(file_path)
 
         mongo.db.exercises.delete_one({'_id': ObjectId(exercise_id)})
+        record_tombstone('exercises', exercise_id)
 
         return jsonify({'message': 'Exercise deleted successfully'}), 200
 
@@ -153,6 +157,12 @@ def update_exercise(exercise_id):
         if result.modified_count == 0:
             return jsonify({'message': 'No changes made'}), 200
 
+        # Only bump the version when something actually changed
+        mongo.db.exercises.update_one(
+            {'_id': ObjectId(exercise_id)},
+            {'$set': version_stamp()}
+        )
+
         return jsonify({'message': 'Exercise updated successfully'}), 200
 
     except Exception as e:
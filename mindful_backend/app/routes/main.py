@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from app import mongo
 from app.models.user import User 
+from app.utils.sync import version_stamp, record_tombstone
+from app.utils.admission import admission_control
 
 main = Blueprint('main', __name__)
 
@@ -17,6 +19,7 @@ def get_user_by_id(user_id):
         return jsonify({'error': 'Invalid user ID format'}), 400
 
 @main.route('/api/register', methods=['POST'])
+@admission_control('auth')
 def register():
     if request.is_json:
         data = request.get_json()
@@ -48,6 +51,7 @@ import datetime
 from flask import current_app
 
 @main.route('/api/login', methods=['POST'])
+@admission_control('auth')
 def login():
     if request.is_json:
         data = request.get_json()
@@ -96,7 +100,8 @@ def upload_music():
         'music_name': music_name,
         'author': author,
         'category': category,
-        'file_path': ''  # temp placeholder
+        'file_path': '',  # temp placeholder
+        **version_stamp()
     }
     result = mongo.db.music.insert_one(music_doc)
     object_id = str(result.inserted_id)
@@ -114,7 +119,7 @@ def upload_music():
     # Update DB with only the filename (relative path)
     mongo.db.music.update_one(
         {'_id': ObjectId(object_id)},
-        {'$set': {'file_path': filename}}
+        {'$set': {'file_path': filename, **version_stamp()}}
     )
 
     return jsonify({'message': 'Music uploaded successfully!'}), 201
@@ -145,6 +150,7 @@ def delete_music(music_id):
                 os.remove(file_path)
 
         mongo.db.music.delete_one({'_id': ObjectId(music_id)})
+        record_tombstone('music', music_id)
 
         return jsonify({'message': 'Music deleted successfully'}), 200
 
@@ -194,7 +200,7 @@ def edit_music(music_id):
         # Update the document
         mongo.db.music.update_one(
             {'_id': ObjectId(music_id)},
-            {'$set': update_data}
+            {'$set': {**update_data, **version_stamp()}}
         )
 
         # Return updated document
@@ -0,0 +1,17 @@
+from flask import Blueprint, jsonify, current_app
+from app.utils.auth import token_required
+from app.utils.admission import get_admission_metrics
+
+metrics = Blueprint('metrics', __name__)
+
+@metrics.route('/api/metrics/admission', methods=['GET'])
+@token_required
+def admission_metrics(current_user_id):
+    """
+    Reports in-flight requests, queue depth and shed counts per endpoint class.
+    Classes appear once they have served their first request.
+    Only users listed in ADMIN_USER_IDS may read it.
+    """
+    if current_user_id not in current_app.config.get('ADMIN_USER_IDS', []):
+        return jsonify({'error': 'Not authorized'}), 403
+    return jsonify(get_admission_metrics()), 200
@@ -1,11 +1,53 @@
 from flask import Blueprint, current_app, request, jsonify
 from app import mongo
 from app.utils.auth import token_required
+from app.utils.sync import version_stamp, next_versions
 import datetime
 from bson import ObjectId # Required if you store comment user_ids as ObjectIds
+from pymongo.errors import BulkWriteError
 
 mood = Blueprint('mood_bp', __name__)
 
+# Upper bound on entries accepted by a single bulk request
+MAX_BULK_MOODS = 500
+# Longest client_key accepted; keys are stored in a unique index
+MAX_CLIENT_KEY_LENGTH = 128
+# Mongo error code for a unique index violation
+DUPLICATE_KEY_ERROR = 11000
+
+_indexes_ready = False
+
+def _ensure_mood_indexes():
+    """
+    Creates the unique index used to drop replayed bulk entries.
+    Only entries that carry a client key are covered, so older entries are unaffected.
+    """
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    mongo.db.mood_entries.create_index(
+        [('user_id', 1), ('client_key', 1)],
+        unique=True,
+        partialFilterExpression={'client_key': {'$exists': True}},
+        name='user_client_key_unique'
+    )
+    _indexes_ready = True
+
+def _parse_client_timestamp(value):
+    """
+    Parses an ISO 8601 timestamp sent by the client into a naive UTC datetime,
+    matching how 'created_at' is stored by log_mood. Returns None if invalid.
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
 @mood.route('/api/moods', methods=['POST'])
 @token_required
 def log_mood(current_user_id):
@@ -28,6 +70,7 @@ def log_mood(current_user_id):
     }
 
     try:
+        mood_entry.update(version_stamp())
         result = mongo.db.mood_entries.insert_one(mood_entry)
         mood_entry['_id'] = str(result.inserted_id) # Convert ObjectId to string
         return jsonify({'message': 'Mood logged successfully', 'mood_entry': mood_entry}), 201
@@ -35,6 +78,113 @@ def log_mood(current_user_id):
         current_app.logger.error(f"Error logging mood: {e}")
         return jsonify({'error': 'Failed to log mood'}), 500
 
+@mood.route('/api/moods/bulk', methods=['POST'])
+@token_required
+def log_moods_bulk(current_user_id):
+    """
+    Logs a batch of mood entries recorded while the client was offline.
+    Expects {'entries': [{'client_key', 'mood', 'created_at', 'notes'?}, ...]}.
+    'client_key' is generated by the client and makes retries safe: an entry whose
+    key was already stored is reported as 'duplicate' instead of being inserted again.
+    Returns a per-item status in the same order as the request.
+    """
+    data = request.get_json(silent=True) or {}
+    entries = data.get('entries')
+
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'error': 'A non-empty list of entries is required'}), 400
+    if len(entries) > MAX_BULK_MOODS:
+        return jsonify({'error': f'At most {MAX_BULK_MOODS} entries are allowed per request'}), 400
+
+    results = [None] * len(entries)
+    docs = []
+    doc_positions = [] # Index in 'entries' for each doc in 'docs'
+    received_at = datetime.datetime.utcnow()
+
+    for i, item in enumerate(entries):
+        if not isinstance(item, dict):
+            results[i] = {'status': 'invalid', 'error': 'Entry must be an object'}
+            continue
+
+        client_key = item.get('client_key')
+        mood_value = item.get('mood')
+        notes = item.get('notes', '')
+        created_at = _parse_client_timestamp(item.get('created_at'))
+
+        if not isinstance(client_key, str) or not client_key:
+            results[i] = {'status': 'invalid', 'error': 'client_key is required'}
+            continue
+        if len(client_key) > MAX_CLIENT_KEY_LENGTH:
+            results[i] = {'status': 'invalid', 'error': f'client_key must be at most {MAX_CLIENT_KEY_LENGTH} characters'}
+            continue
+        results[i] = {'client_key': client_key}
+        if not isinstance(mood_value, str) or not mood_value:
+            results[i].update({'status': 'invalid', 'error': 'Mood must be a non-empty string'})
+            continue
+        if not isinstance(notes, str):
+            results[i].update({'status': 'invalid', 'error': 'Notes must be a string'})
+            continue
+        if created_at is None:
+            results[i].update({'status': 'invalid', 'error': 'created_at must be an ISO 8601 timestamp'})
+            continue
+
+        docs.append({
+            'user_id': current_user_id,
+            'client_key': client_key,
+            'mood': mood_value,
+            'notes': notes,
+            'created_at': created_at,
+            'received_at': received_at
+        })
+        doc_positions.append(i)
+
+    if docs:
+        write_errors = {}
+        try:
+            _ensure_mood_indexes()
+            # One counter round trip for the whole batch
+            first_version = next_versions(len(docs))
+            for offset, doc in enumerate(docs):
+                doc.update(version_stamp(first_version + offset))
+            mongo.db.mood_entries.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            write_errors = {err['index']: err for err in e.details.get('writeErrors', [])}
+        except Exception as e:
+            current_app.logger.error(f"Error logging mood batch: {e}")
+            return jsonify({'error': 'Failed to log moods'}), 500
+
+        duplicates = {} # client_key -> positions reported as 'duplicate'
+        for doc_index, (doc, position) in enumerate(zip(docs, doc_positions)):
+            err = write_errors.get(doc_index)
+            if err is None:
+                # insert_many sets '_id' on each inserted document
+                results[position].update({'status': 'created', '_id': str(doc['_id'])})
+            elif err.get('code') == DUPLICATE_KEY_ERROR:
+                results[position]['status'] = 'duplicate'
+                duplicates.setdefault(doc['client_key'], []).append(position)
+            else:
+                current_app.logger.error(f"Error logging mood entry: {err.get('errmsg')}")
+                results[position].update({'status': 'failed', 'error': 'Failed to log mood'})
+
+        if duplicates:
+            # Retries after a lost response still need the ids of the entries stored the first time
+            try:
+                stored = mongo.db.mood_entries.find(
+                    {'user_id': current_user_id, 'client_key': {'$in': list(duplicates)}},
+                    {'client_key': 1}
+                )
+                for entry in stored:
+                    for position in duplicates.get(entry['client_key'], []):
+                        results[position]['_id'] = str(entry['_id'])
+            except Exception as e:
+                current_app.logger.error(f"Error looking up duplicate moods: {e}")
+
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+
+    return jsonify({'message': 'Mood batch processed', 'summary': summary, 'results': results}), 200
+
 @mood.route('/api/moods', methods=['GET'])
 @token_required
 def get_mood_history(current_user_id):
@@ -51,9 +201,10 @@ def get_mood_history(current_user_id):
         mood_history_list = []
         for entry in mood_history_cursor:
             entry['_id'] = str(entry['_id']) # Convert ObjectId to string
-            # Ensure 'created_at' is a string for consistent parsing on Flutter side
-            if isinstance(entry.get('created_at'), datetime.datetime):
-                entry['created_at'] = entry['created_at'].isoformat() + 'Z' # Convert to ISO format string with Z for UTC
+            # Ensure timestamps are strings for consistent parsing on Flutter side
+            for field in ('created_at', 'updated_at', 'received_at'):
+                if isinstance(entry.get(field), datetime.datetime):
+                    entry[field] = entry[field].isoformat() + 'Z' # Convert to ISO format string with Z for UTC
             
             mood_history_list.append(entry)
             
@@ -1,11 +1,37 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from app import mongo
 from app.utils.auth import token_required
+from app.utils.sync import version_stamp, record_tombstone
+from app.utils import events
+from app.utils.admission import get_limiter
 from bson import ObjectId
+from bson.errors import InvalidId
 import datetime
+import json
+import threading
 
 post = Blueprint('post', __name__)
 
+# Maximum number of posts a single event stream can follow
+MAX_STREAM_POSTS = 50
+# Maximum number of event streams one user can hold open at once
+MAX_STREAMS_PER_USER = 3
+
+_open_streams = {} # user_id -> number of open streams
+_open_streams_lock = threading.Lock()
+
+def _post_channel(post_id):
+    return f"post:{post_id}"
+
+def _publish_post_event(post_id, event_type, data):
+    """
+    Publishes a post activity event. Failures are logged and never fail the request.
+    """
+    try:
+        events.publish(_post_channel(post_id), event_type, data)
+    except Exception as e:
+        current_app.logger.error(f"Error publishing {event_type} event: {e}")
+
 @post.route('/api/posts', methods=['POST'])
 @token_required
 def create_post(current_user_id):
@@ -34,7 +60,8 @@ def create_post(current_user_id):
         'category': category,     # New: Add category to post data
         'comments': [],           # New: Initialize comments as an empty list
         'upvotes': 0,             # New: Initialize upvotes to 0
-        'created_at': datetime.datetime.utcnow()
+        'created_at': datetime.datetime.utcnow(),
+        **version_stamp()
     }
 
     result = mongo.db.posts.insert_one(post_data)
@@ -77,6 +104,7 @@ def delete_post(current_user_id, post_id):
         return jsonify({'error': 'Not authorized'}), 403
 
     mongo.db.posts.delete_one({'_id': ObjectId(post_id)})
+    record_tombstone('posts', post_id, user_id=current_user_id)
     return jsonify({'message': 'Post deleted'}), 200
 
 # --- New Endpoints for Upvoting and Comments ---
@@ -99,14 +127,14 @@ def upvote_post(current_user_id, post_id):
         # User already upvoted → remove their upvote
         mongo.db.posts.update_one(
             {'_id': oid},
-            {'$pull': {'upvoters': current_user_id}}
+            {'$pull': {'upvoters': current_user_id}, '$set': version_stamp()}
         )
         message = "Upvote removed"
     else:
         # User has not upvoted → add their upvote
         mongo.db.posts.update_one(
             {'_id': oid},
-            {'$push': {'upvoters': current_user_id}}
+            {'$push': {'upvoters': current_user_id}, '$set': version_stamp()}
         )
         message = "Post upvoted"
 
@@ -115,6 +143,8 @@ def upvote_post(current_user_id, post_id):
     updated_post['_id'] = str(updated_post['_id'])
     upvote_count = len(updated_post.get('upvoters', []))
 
+    _publish_post_event(post_id, 'upvote', {'post_id': post_id, 'upvotes': upvote_count})
+
     return jsonify({'message': message, 'upvotes': upvote_count}), 200
 
 @post.route('/api/posts/<post_id>/comments', methods=['POST'])
@@ -139,11 +169,16 @@ def add_comment(current_user_id, post_id):
 
     result = mongo.db.posts.update_one(
         {'_id': ObjectId(post_id)},
-        {'$push': {'comments': comment}}
+        {'$push': {'comments': comment}, '$set': version_stamp()}
     )
 
     if result.matched_count == 0:
         return jsonify({'error': 'Post not found'}), 404
+
+    _publish_post_event(post_id, 'comment', {
+        'post_id': post_id,
+        'comment': {**comment, 'created_at': comment['created_at'].isoformat() + 'Z'}
+    })
     
     # Optionally convert ObjectId to string if needed
     # comment['_id'] = str(comment.get('_id', ''))
@@ -156,7 +191,7 @@ def get_comments(current_user_id, post_id):
     """
     Retrieves all comments for a specific post.
     """
-    post_doc = mongo.db.posts.find_one({'_id': ObjectId(post_id)})
+    post_doc = mongo.db.posts.find_one({'_id': ObjectId(post_id)}, {'comments': 1})
 
     if not post_doc:
         return jsonify({'error': 'Post not found'}), 404
@@ -166,3 +201,88 @@ def get_comments(current_user_id, post_id):
     # For now, assuming user_id is already a string
     return jsonify(comments), 200
 
+@post.route('/api/posts/stream', methods=['GET'])
+@token_required
+def stream_post_events(current_user_id):
+    """
+    Server-sent event stream of new comments and upvotes for the given posts.
+    Pass ?post_ids=<id>,<id>,... for the posts being viewed. Reconnecting clients
+    send the Last-Event-ID header to receive the events they missed. If those can
+    no longer be replayed, a 'reset' event is sent and the client should refetch
+    /api/posts/<id>/comments for that post.
+    A comment line is sent every SSE_HEARTBEAT_SECONDS to keep the connection open.
+    Each open stream holds a server thread, so deployments need a threaded (or
+    async) server; open streams are capped by the 'stream' admission class and
+    MAX_STREAMS_PER_USER.
+    """
+    post_ids = [p for p in request.args.get('post_ids', '').split(',') if p]
+    if not post_ids:
+        return jsonify({'error': 'post_ids is required'}), 400
+    if len(post_ids) > MAX_STREAM_POSTS:
+        return jsonify({'error': f'At most {MAX_STREAM_POSTS} posts can be followed'}), 400
+
+    try:
+        oids = [ObjectId(p) for p in post_ids]
+    except InvalidId:
+        return jsonify({'error': 'Invalid post ID'}), 400
+
+    found = mongo.db.posts.count_documents({'_id': {'$in': oids}})
+    if found != len(set(oids)):
+        return jsonify({'error': 'Post not found'}), 404
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or None
+
+    with _open_streams_lock:
+        if _open_streams.get(current_user_id, 0) >= MAX_STREAMS_PER_USER:
+            return jsonify({'error': 'Too many open streams'}), 429
+        _open_streams[current_user_id] = _open_streams.get(current_user_id, 0) + 1
+
+    limiter = get_limiter('stream')
+    if not limiter.acquire():
+        _close_user_stream(current_user_id)
+        response = jsonify({'error': 'Server is busy, please retry later'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(current_app.config.get('SSE_HEARTBEAT_SECONDS', 15))
+        return response
+
+    heartbeat = current_app.config.get('SSE_HEARTBEAT_SECONDS', 15)
+    broker = events.get_broker()
+    subscription = broker.subscribe([_post_channel(p) for p in post_ids], last_event_id)
+
+    def close():
+        broker.unsubscribe(subscription)
+        limiter.release()
+        _close_user_stream(current_user_id)
+
+    def generate():
+        yield f"retry: {heartbeat * 1000}\n\n"
+        while True:
+            # Once overflowed, send whatever is still queued without waiting, then close
+            # so the client reconnects and resumes from the last id it received
+            event = subscription.get(timeout=0 if subscription.overflowed else heartbeat)
+            if event is None:
+                if subscription.overflowed:
+                    break
+                yield ": heartbeat\n\n"
+                continue
+            data = event['data']
+            if event['type'] == 'reset':
+                data = {'post_id': event['channel'][len(_post_channel('')):]}
+            yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(data)}\n\n"
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Runs when the server closes the response, even if streaming never started
+    response.call_on_close(close)
+    return response
+
+def _close_user_stream(user_id):
+    with _open_streams_lock:
+        remaining = _open_streams.get(user_id, 0) - 1
+        if remaining > 0:
+            _open_streams[user_id] = remaining
+        else:
+            _open_streams.pop(user_id, None)
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from app import mongo
 from app.utils.auth import token_required
+from app.utils.admission import admission_control
 import joblib
 import datetime
 
@@ -18,6 +19,7 @@ except Exception as e:
 
 @prediction.route('/api/predict', methods=['POST'])
 @token_required
+@admission_control('inference', per_user=True)
 def predict_mental_health(current_user_id):
     """
     Predict mental health category from text using the SVC pipeline.
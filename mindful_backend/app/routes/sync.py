@@ -0,0 +1,106 @@
+from flask import Blueprint, request, jsonify, current_app
+from app import mongo
+from app.utils.auth import token_required
+from app.utils.sync import SYNCED_COLLECTIONS, ensure_sync_indexes, settled_before
+from app.routes.exercise import EXERCISE_VIDEOS_DIR
+from bson import ObjectId
+import datetime
+
+sync = Blueprint('sync', __name__)
+
+# Maximum number of changes returned per collection in one response
+SYNC_PAGE_SIZE = 500
+
+def _serialize(value):
+    """
+    Converts ObjectIds and datetimes (including nested ones, e.g. post comments)
+    into the same string formats the other endpoints return.
+    """
+    if isinstance(value, dict):
+        return {k: _serialize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_serialize(v) for v in value]
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat() + 'Z'
+    return value
+
+@sync.route('/api/sync', methods=['GET'])
+@token_required
+def get_changes(current_user_id):
+    """
+    Returns everything that changed since the client's last sync token.
+    Pass ?since=<token> (omit or 0 for a full sync) and store the returned 'token'
+    for the next call. When 'has_more' is true, call again straight away with it.
+    Deleted documents are listed by id under 'deleted'.
+    The token stops short of writes from the last SYNC_SETTLE_SECONDS, so those are
+    sent again on the next call; clients must apply changes idempotently.
+    Documents written before version stamps existed are only included once
+    `flask sync backfill` has been run.
+    """
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        return jsonify({'error': 'Invalid sync token'}), 400
+
+    try:
+        ensure_sync_indexes()
+        settle_time = settled_before()
+
+        # Each stream is (name, documents sorted by version, hit the page limit?)
+        streams = []
+        for name, config in SYNCED_COLLECTIONS.items():
+            query = {'version': {'$gt': since}}
+            if config['per_user']:
+                query['user_id'] = current_user_id
+            docs = list(mongo.db[config['collection']].find(query).sort('version', 1).limit(SYNC_PAGE_SIZE))
+            streams.append((name, docs, len(docs) == SYNC_PAGE_SIZE))
+
+        per_user = [name for name, config in SYNCED_COLLECTIONS.items() if config['per_user']]
+        shared = [name for name, config in SYNCED_COLLECTIONS.items() if not config['per_user']]
+        tombstones = list(mongo.db.tombstones.find({
+            'version': {'$gt': since},
+            '$or': [
+                {'collection': {'$in': shared}},
+                {'collection': {'$in': per_user}, 'user_id': current_user_id}
+            ]
+        }).sort('version', 1).limit(SYNC_PAGE_SIZE))
+        streams.append(('tombstones', tombstones, len(tombstones) == SYNC_PAGE_SIZE))
+
+        # If any stream was cut off, only return changes up to the point where every
+        # stream is complete, so the next call does not skip anything.
+        capped = [docs[-1]['version'] for _, docs, is_capped in streams if is_capped]
+        cutoff = min(capped) if capped else None
+
+        versions = [] # (version, still settling?) for every returned change
+        changes = {name: [] for name in SYNCED_COLLECTIONS}
+        deleted = {name: [] for name in SYNCED_COLLECTIONS}
+        for name, docs, _ in streams:
+            for doc in docs:
+                if cutoff is not None and doc['version'] > cutoff:
+                    break
+                updated_at = doc.get('updated_at')
+                versions.append((doc['version'], updated_at is not None and updated_at >= settle_time))
+                if name == 'tombstones':
+                    deleted[doc['collection']].append(doc['doc_id'])
+                    continue
+                if name == 'exercises' and doc.get('file_path'):
+                    doc['video_url'] = f"/uploads/{EXERCISE_VIDEOS_DIR}/{doc['file_path']}"
+                changes[name].append(_serialize(doc))
+
+        # A lower version may still be in flight behind a recent write, so the token
+        # only moves past changes that have settled.
+        settling = [version for version, recent in versions if recent]
+        limit = min(settling) if settling else None
+        token = max([since] + [version for version, _ in versions if limit is None or version < limit])
+
+        return jsonify({
+            'token': str(token),
+            'has_more': cutoff is not None and limit is None,
+            'changes': changes,
+            'deleted': deleted
+        }), 200
+    except Exception as e:
+        current_app.logger.error(f"Error building sync response: {e}")
+        return jsonify({'error': 'Failed to fetch changes'}), 500
@@ -0,0 +1,195 @@
+from functools import wraps
+from flask import jsonify, current_app
+import math
+import threading
+import time
+
+class ConcurrencyLimiter:
+    """
+    Caps how many requests of one endpoint class run at once.
+    Requests over the limit wait in a bounded queue for at most 'queue_timeout'
+    seconds; when the queue is full or the wait runs out they are shed.
+    """
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.quota_rejected = 0
+
+    def acquire(self):
+        """
+        Returns True once a slot is held, or False if the request was shed.
+        """
+        with self._cond:
+            # Newcomers only skip the queue when nobody is waiting, so a slot freed by
+            # release() goes to the waiter it notified
+            if self.in_flight < self.max_concurrent and self.queued == 0:
+                self.in_flight += 1
+                self.admitted += 1
+                return True
+            if self.queued >= self.max_queue:
+                self.shed_queue_full += 1
+                return False
+
+            self.queued += 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self.in_flight >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed_timeout += 1
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self.queued -= 1
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def record_quota_rejection(self):
+        with self._cond:
+            self.quota_rejected += 1
+
+    def metrics(self):
+        with self._cond:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'in_flight': self.in_flight,
+                'queue_depth': self.queued,
+                'admitted': self.admitted,
+                'shed_queue_full': self.shed_queue_full,
+                'shed_timeout': self.shed_timeout,
+                'quota_rejected': self.quota_rejected,
+            }
+
+class TokenBucketQuota:
+    """
+    Per-user token buckets: each user may make 'burst' requests at once and then
+    'rate' requests per second. Buckets that have refilled to 'burst' are dropped
+    every 'prune_interval' seconds; a missing bucket is the same as a full one.
+    """
+    def __init__(self, rate, burst, prune_interval=60):
+        self.rate = rate
+        self.burst = burst
+        self.prune_interval = prune_interval
+        self._lock = threading.Lock()
+        self._buckets = {} # user_id -> (tokens, last refill time)
+        self._last_prune = time.monotonic()
+
+    def take(self, user_id):
+        """
+        Returns 0 if the request is allowed, otherwise the seconds until a token is available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_prune > self.prune_interval:
+                self._prune(now)
+            tokens, last = self._buckets.get(user_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self._buckets[user_id] = (tokens - 1, now)
+                return 0
+            self._buckets[user_id] = (tokens, now)
+            return (1 - tokens) / self.rate
+
+    def _prune(self, now):
+        """
+        Drops buckets that are full again. Must be called with the lock held.
+        """
+        self._last_prune = now
+        full = [
+            user_id for user_id, (tokens, last) in self._buckets.items()
+            if tokens + (now - last) * self.rate >= self.burst
+        ]
+        for user_id in full:
+            del self._buckets[user_id]
+
+    def refund(self, user_id):
+        """
+        Returns a token taken for a request that was shed before doing any work.
+        """
+        with self._lock:
+            if user_id in self._buckets:
+                tokens, last = self._buckets[user_id]
+                self._buckets[user_id] = (min(self.burst, tokens + 1), last)
+
+_limiters = {}
+_quotas = {}
+_registry_lock = threading.Lock()
+
+def _get_limiter(endpoint_class):
+    with _registry_lock:
+        if endpoint_class not in _limiters:
+            config = current_app.config['ADMISSION_LIMITS'][endpoint_class]
+            _limiters[endpoint_class] = ConcurrencyLimiter(
+                endpoint_class,
+                config['max_concurrent'],
+                config['max_queue'],
+                config['queue_timeout']
+            )
+            if config.get('quota_rate'):
+                _quotas[endpoint_class] = TokenBucketQuota(config['quota_rate'], config['quota_burst'])
+        return _limiters[endpoint_class], _quotas.get(endpoint_class)
+
+def get_limiter(endpoint_class):
+    """
+    Limiter for routes that cannot use the decorator, e.g. streaming responses
+    whose slot must be held until the stream closes.
+    """
+    return _get_limiter(endpoint_class)[0]
+
+def get_admission_metrics():
+    with _registry_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.metrics() for name, limiter in limiters.items()}
+
+def _retry_response(error, status, retry_after):
+    response = jsonify({'error': error})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def admission_control(endpoint_class, per_user=False):
+    """
+    Limits concurrent requests for an endpoint class configured in ADMISSION_LIMITS.
+    With per_user=True the route must sit under @token_required; the user's
+    token-bucket quota is checked before the request is queued, and the token is
+    given back if the request is then shed.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            limiter, quota = _get_limiter(endpoint_class)
+
+            charged = per_user and quota is not None
+            if charged:
+                current_user_id = args[0]
+                wait = quota.take(current_user_id)
+                if wait:
+                    limiter.record_quota_rejection()
+                    return _retry_response('Rate limit exceeded, please retry later', 429, wait)
+
+            if not limiter.acquire():
+                if charged:
+                    quota.refund(current_user_id)
+                return _retry_response('Server is busy, please retry later', 503, limiter.queue_timeout)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                limiter.release()
+
+        return decorated
+    return decorator
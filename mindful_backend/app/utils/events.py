@@ -0,0 +1,192 @@
+from collections import deque
+import itertools
+import queue
+import threading
+import time
+import uuid
+
+class Subscription:
+    """
+    A subscriber's view of one or more channels.
+    Events are buffered in a bounded queue; if the subscriber falls behind and the
+    queue fills up, the subscription is marked as overflowed and stops accepting
+    events. The stream should then send what is queued and close, so the client
+    reconnects and resumes with Last-Event-ID without a gap.
+    """
+    def __init__(self, channels, max_queue):
+        self.channels = set(channels)
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def deliver(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """
+        Waits up to 'timeout' seconds for the next event. Returns None on timeout.
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class EventBroker:
+    """
+    Interface for publishing events to subscribers.
+    Replace the in-process broker with one backed by a shared message bus when
+    running several workers, so an event published by one worker reaches the
+    subscribers connected to the others.
+    """
+    def publish(self, channel, event_type, data):
+        raise NotImplementedError
+
+    def subscribe(self, channels, last_event_id=None):
+        """
+        Subscribes to 'channels', first replaying events after 'last_event_id'.
+        When missed events can no longer be replayed, a 'reset' event is queued for
+        the affected channel instead, telling the client to refetch its state.
+        """
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+class InProcessBroker(EventBroker):
+    """
+    Delivers events to subscribers in the current process.
+    Keeps the last 'history_size' events per channel so reconnecting clients can
+    resume from their Last-Event-ID. A channel's history is dropped once it has no
+    subscribers and nothing was published to it for 'history_ttl' seconds.
+    Event ids are '<epoch>-<sequence>', where the epoch changes on every start, so
+    ids from before a restart are recognised and answered with a reset.
+    """
+    def __init__(self, max_queue=100, history_size=200, history_ttl=600):
+        self.max_queue = max_queue
+        self.history_size = history_size
+        self.history_ttl = history_ttl
+        self.epoch = uuid.uuid4().hex[:12]
+        self._ids = itertools.count(1)
+        self._last_seq = 0
+        self._lock = threading.Lock()
+        self._subscribers = {} # channel -> set of Subscription
+        self._history = {} # channel -> deque of recent events
+        self._evicted_through = {} # channel -> sequence of the newest event pushed out of its history
+        self._pruned_through = 0 # newest sequence of any channel whose history was pruned
+        self._last_publish = {} # channel -> monotonic time of the last publish
+        self._last_prune = time.monotonic()
+
+    def publish(self, channel, event_type, data):
+        now = time.monotonic()
+        with self._lock:
+            seq = next(self._ids)
+            self._last_seq = seq
+            event = {'id': f"{self.epoch}-{seq}", 'seq': seq, 'channel': channel, 'type': event_type, 'data': data}
+            history = self._history.setdefault(channel, deque(maxlen=self.history_size))
+            if len(history) == history.maxlen:
+                self._evicted_through[channel] = history[0]['seq']
+            history.append(event)
+            self._last_publish[channel] = now
+            # Delivered under the lock so every subscriber sees events in id order
+            for subscription in self._subscribers.get(channel, ()):
+                subscription.deliver(event)
+            if now - self._last_prune > self.history_ttl / 10:
+                self._prune(now)
+        return event
+
+    def _prune(self, now):
+        """
+        Drops the history of idle channels. Must be called with the lock held.
+        """
+        self._last_prune = now
+        expired = [
+            channel for channel, last in self._last_publish.items()
+            if now - last > self.history_ttl and channel not in self._subscribers
+        ]
+        for channel in expired:
+            self._pruned_through = max(self._pruned_through, self._history[channel][-1]['seq'])
+            del self._history[channel]
+            del self._last_publish[channel]
+            self._evicted_through.pop(channel, None)
+
+    def _parse_event_id(self, last_event_id):
+        """
+        Returns the sequence number of an id issued by this broker instance, or
+        None if it is malformed or from an earlier start.
+        """
+        epoch, _, seq = str(last_event_id).rpartition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def _missed_unavailable(self, channel, last_seq):
+        """
+        True if events after 'last_seq' on 'channel' may have left the history.
+        Must be called with the lock held.
+        """
+        if last_seq is None:
+            return True
+        if channel not in self._history:
+            return last_seq < self._pruned_through
+        return last_seq < self._evicted_through.get(channel, 0)
+
+    def subscribe(self, channels, last_event_id=None):
+        subscription = Subscription(channels, self.max_queue)
+        with self._lock:
+            if last_event_id is not None:
+                last_seq = self._parse_event_id(last_event_id)
+                reset = {c for c in subscription.channels if self._missed_unavailable(c, last_seq)}
+                # Resets go first so a truncated replay still resumes from a replayed id
+                for channel in sorted(reset):
+                    subscription.deliver({
+                        'id': f"{self.epoch}-{self._last_seq}",
+                        'seq': self._last_seq,
+                        'channel': channel,
+                        'type': 'reset',
+                        'data': {}
+                    })
+                missed = [
+                    event
+                    for channel in subscription.channels - reset
+                    for event in self._history.get(channel, ())
+                    if event['seq'] > last_seq
+                ]
+                missed.sort(key=lambda e: e['seq'])
+                # Replay at most one queue's worth; after sending it the stream closes
+                # and the client resumes from the last replayed id.
+                for event in missed[:self.max_queue]:
+                    subscription.deliver(event)
+                if len(missed) > self.max_queue:
+                    subscription.overflowed = True
+            for channel in subscription.channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+_broker = InProcessBroker()
+
+def get_broker():
+    return _broker
+
+def set_broker(broker):
+    """
+    Swaps the broker used by publish() and the stream endpoints.
+    """
+    global _broker
+    _broker = broker
+
+def publish(channel, event_type, data):
+    return _broker.publish(channel, event_type, data)
@@ -0,0 +1,76 @@
+from flask import current_app
+from pymongo import ReturnDocument
+from app import mongo
+import datetime
+
+# Collections exposed through /api/sync. Per-user collections are filtered on 'user_id'.
+SYNCED_COLLECTIONS = {
+    'moods': {'collection': 'mood_entries', 'per_user': True},
+    'posts': {'collection': 'posts', 'per_user': True},
+    'music': {'collection': 'music', 'per_user': False},
+    'exercises': {'collection': 'exercises', 'per_user': False},
+}
+
+_indexes_ready = False
+
+def next_versions(count=1):
+    """
+    Reserves 'count' consecutive versions from the global change counter.
+    Returns the first reserved version; the block is [first, first + count).
+    """
+    counter = mongo.db.counters.find_one_and_update(
+        {'_id': 'sync_version'},
+        {'$inc': {'value': count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter['value'] - count + 1
+
+def version_stamp(version=None):
+    """
+    Returns the fields to $set (or merge into a new document) on every write.
+    """
+    return {
+        'version': version if version is not None else next_versions(),
+        'updated_at': datetime.datetime.utcnow()
+    }
+
+def settled_before():
+    """
+    Versions are reserved before the write commits, so a lower version can become
+    visible after a higher one. Writes stamped before the returned time are assumed
+    to have committed, along with every lower version reserved before them.
+    """
+    seconds = current_app.config.get('SYNC_SETTLE_SECONDS', 5)
+    return datetime.datetime.utcnow() - datetime.timedelta(seconds=seconds)
+
+def record_tombstone(name, doc_id, user_id=None):
+    """
+    Records that a document was deleted so syncing clients can drop it.
+    'name' is a key of SYNCED_COLLECTIONS.
+    """
+    tombstone = {
+        'collection': name,
+        'doc_id': str(doc_id),
+        'deleted_at': datetime.datetime.utcnow(),
+        **version_stamp()
+    }
+    if user_id is not None:
+        tombstone['user_id'] = user_id
+    mongo.db.tombstones.insert_one(tombstone)
+
+def ensure_sync_indexes():
+    """
+    Creates the indexes that back the change feed queries.
+    """
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    for config in SYNCED_COLLECTIONS.values():
+        keys = [('version', 1)]
+        if config['per_user']:
+            keys.insert(0, ('user_id', 1))
+        mongo.db[config['collection']].create_index(keys)
+    mongo.db.tombstones.create_index([('collection', 1), ('version', 1)])
+    mongo.db.tombstones.create_index([('collection', 1), ('user_id', 1), ('version', 1)])
+    _indexes_ready = True
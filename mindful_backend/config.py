@@ -4,4 +4,20 @@ import os
 
 class DevelopmentConfig:
     MONGO_URI = os.getenv("MONGO_URI")  # use getenv, same as os.environ.get
-    DEBUG = True
\ No newline at end of file
+    DEBUG = True
+    # Seconds between keep-alive comments on server-sent event streams
+    SSE_HEARTBEAT_SECONDS = 15
+    # Writes newer than this are re-sent by /api/sync until lower versions still in flight have landed
+    SYNC_SETTLE_SECONDS = 5
+    # Comma-separated user ids allowed to read operational endpoints such as /api/metrics/admission
+    ADMIN_USER_IDS = [u.strip() for u in os.getenv("ADMIN_USER_IDS", "").split(",") if u.strip()]
+    # Concurrency limits for CPU-bound endpoint classes (see app/utils/admission.py).
+    # quota_rate/quota_burst set a per-user token bucket for routes using per_user=True.
+    ADMISSION_LIMITS = {
+        'inference': {'max_concurrent': 2, 'max_queue': 8, 'queue_timeout': 2.0,
+                      'quota_rate': 0.5, 'quota_burst': 5},
+        'auth': {'max_concurrent': 4, 'max_queue': 16, 'queue_timeout': 3.0},
+        # Open server-sent event streams; each holds a server thread while open, so
+        # keep this well below the thread count of the (threaded) server
+        'stream': {'max_concurrent': 50, 'max_queue': 0, 'queue_timeout': 0},
+    }